@@ -1,16 +1,32 @@
+import asyncio
+import collections
 import os
+import re
+import threading
+
 import streamlit as st
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
+from langchain_core.output_parsers import StrOutputParser
+
+# For persisting LLM responses across sessions and restarts
+try:
+    from langchain.globals import get_llm_cache, set_llm_cache
+    from langchain_community.cache import SQLiteCache
+    from langchain_core.outputs import Generation
+except ImportError:
+    get_llm_cache = None
+    set_llm_cache = None
 
 # For language detection
 try:
-    from pygments.lexers import guess_lexer
+    from pygments.lexers import get_all_lexers, guess_lexer, guess_lexer_for_filename
     from pygments.util import ClassNotFound
 except ImportError:
+    get_all_lexers = None
     guess_lexer = None
+    guess_lexer_for_filename = None
     ClassNotFound = Exception
 
 # Set Streamlit page config for a wider layout
@@ -24,100 +40,235 @@ st.set_page_config(
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-# Set up LLM
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.2, google_api_key=GOOGLE_API_KEY)
+MODEL_NAME = "gemini-1.5-flash"
+MODEL_TEMPERATURE = 0.2
 
-# Supported languages for highlighting
-LANGUAGES = [
-   "python", "javascript", "java", "c", "cpp", "csharp", "go", "ruby", "php", "rust", "typescript", "kotlin", "swift", "scala", "perl", "r", "bash", "html", "css", "sql", "json", "xml", "yaml", "markdown"
-]
+# Cache Gemini responses on disk so identical requests survive sessions,
+# users, and server restarts. BaseChatModel.stream() never consults the
+# implicit LLM cache (only the invoke/generate path does), so stream_chain
+# below checks and fills this cache explicitly; the speculative ainvoke
+# fallback goes through it via LangChain itself. SQLiteCache construction
+# builds a SQLAlchemy engine and ensures the table exists, so it is cached
+# as a resource rather than rebuilt on every rerun.
+@st.cache_resource
+def _init_llm_cache():
+    cache = SQLiteCache(database_path=".llm_cache.sqlite")
+    set_llm_cache(cache)
+    return cache
 
-# --- Session State for Version History ---
-if "history" not in st.session_state:
-    st.session_state.history = []
+if set_llm_cache:
+    _init_llm_cache()
 
-# Add clear flag to session state
-if "clear_triggered" not in st.session_state:
-    st.session_state.clear_triggered = False
+# --- Prompt template for code cleaning and commenting ---
+prompt = PromptTemplate.from_template(
+    "You are a helpful code formatter and explainer. "
+    "Given the following messy or unordered {language} code, return a clean, well-formatted, and readable version with helpful comments explaining the code. "
+    "Do not add explanations outside the code, just return the cleaned and commented code.\n\n"
+    "Messy code:\n{code}\n\nCleaned and commented code:"
+)
 
-# Add text input state
-if "text_input_value" not in st.session_state:
-    st.session_state.text_input_value = ""
+# --- Prompt template for code explanation ---
+explain_prompt = PromptTemplate.from_template(
+    "You are a helpful programming assistant. "
+    "Explain what the following {language} code does, step by step, in a visually structured way. "
+    "For each important code line or block, start with a callout (➤) and show the code using inline code formatting (single backticks). "
+    "Then, use bullet points to explain what that line or block does. "
+    "Highlight important terms or concepts in bold. "
+    "Use clear, readable markdown, and make the explanation easy to scan, like a professional code review or tutorial.\n\n"
+    "Code:\n{code}\n\nExplanation:"
+)
 
-# --- Professional Header ---
-st.markdown("""
-<div class="main-header">
-    <div style="display: flex; justify-content: space-between; align-items: center;">
-        <div>
-            <h1 style="color: white; margin: 0; font-size: 2.5rem; font-weight: 700;">🧹 Universal Code Optimizer</h1>
-            <p style="color: #e3f2fd; margin: 0; font-size: 1.2rem;">AI-Powered Code Optimization & Documentation</p>
-        </div>
-        <div style="text-align: right;">
-            <h3 style="color: white; margin: 0;">✨ Features</h3>
-            <p style="color: #e3f2fd; margin: 0; font-size: 0.9rem;">• Multi-language Support<br>• Smart Optimization<br>• Auto Documentation</p>
-        </div>
-    </div>
-</div>
-""", unsafe_allow_html=True)
+# --- Prompt template returning cleaned code and explanation in one call ---
+# A single Gemini round-trip answers both "Optimize" and the follow-up
+# "Explain Optimized Code", instead of paying a second full network trip.
+combined_prompt = PromptTemplate.from_template(
+    "You are a helpful code formatter and explainer. "
+    "Given the following messy or unordered {language} code, do two things. "
+    "First, return a clean, well-formatted, and readable version with helpful comments explaining the code. "
+    "Second, explain what the cleaned code does, step by step, in clear, readable markdown: "
+    "for each important code line or block, start with a callout (➤), show the code using inline code formatting (single backticks), "
+    "use bullet points to explain what it does, and highlight important terms or concepts in bold.\n"
+    "Format your answer exactly as:\n"
+    "===CLEANED===\n<cleaned and commented code>\n===EXPLANATION===\n<explanation>\n\n"
+    "Messy code:\n{code}"
+)
 
-# --- Features Section ---
-st.markdown("""
-<div class="feature-card">
-    <h2 style="color: #007acc; margin-bottom: 1rem;">🚀 What We Do</h2>
-    <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(250px, 1fr)); gap: 1rem;">
-        <div style="background: rgba(0, 122, 204, 0.1); padding: 1rem; border-radius: 8px; border-left: 4px solid #007acc;">
-            <h4 style="margin: 0 0 0.5rem 0;">🎯 Smart Optimization</h4>
-            <p style="margin: 0; font-size: 0.9rem;">Automatically optimize and structure your code for better readability</p>
-        </div>
-        <div style="background: rgba(0, 122, 204, 0.1); padding: 1rem; border-radius: 8px; border-left: 4px solid #007acc;">
-            <h4 style="margin: 0 0 0.5rem 0;">📝 Auto Documentation</h4>
-            <p style="margin: 0; font-size: 0.9rem;">Generate comprehensive comments and documentation</p>
-        </div>
-        <div style="background: rgba(0, 122, 204, 0.1); padding: 1rem; border-radius: 8px; border-left: 4px solid #007acc;">
-            <h4 style="margin: 0 0 0.5rem 0;">🔍 Multi-Language</h4>
-            <p style="margin: 0; font-size: 0.9rem;">Support for 20+ programming languages</p>
-        </div>
-    </div>
-</div>
-""", unsafe_allow_html=True)
+# Set up LLM and chains once per process; Streamlit reruns this whole script on
+# every interaction, so cache them as resources instead of rebuilding each time.
+@st.cache_resource
+def get_llm():
+    return ChatGoogleGenerativeAI(model=MODEL_NAME, temperature=MODEL_TEMPERATURE, google_api_key=GOOGLE_API_KEY)
 
-# --- Code Input Section ---
-col_head, col_upload = st.columns([6, 1], gap="small")
-with col_head:
-    st.markdown("""
-    <div style='margin-top:1.2rem; margin-bottom:0; display:flex; align-items:center;'>
-      <h2 style='color:#007acc; font-size:1.6rem; margin:0; display:inline; vertical-align:middle;'>Paste Your Code</h2>
-    </div>
-    """, unsafe_allow_html=True)
-with col_upload:
-    uploaded_file = st.file_uploader(" ", type=None, help="Upload any code file to get started", key="main_file_uploader")
-    if uploaded_file:
-        uploaded_code = uploaded_file.read().decode("utf-8")
+@st.cache_resource
+def get_chains():
+    # LCEL runnables instead of the legacy LLMChain: no deprecated Chain
+    # machinery per call, plain strings out, and .stream()/.batch() for free.
+    llm = get_llm()
+    parser = StrOutputParser()
+    return (
+        prompt | llm | parser,
+        explain_prompt | llm | parser,
+        combined_prompt | llm | parser,
+    )
+
+# Background event loop for speculative LLM calls, started once per process.
+@st.cache_resource
+def get_background_loop():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+# Completed LLM responses memoized per process, so repeated identical requests
+# skip the Gemini round-trip. A plain dict behind st.cache_resource (rather
+# than st.cache_data on the runner functions) so handlers can check for a hit
+# and stream tokens into the page only on a miss.
+RESPONSE_MEMO_MAX = 256
+
+@st.cache_resource
+def get_response_memo():
+    return collections.OrderedDict()
+
+def stream_chain(chain, inputs, key, code_language=None):
+    """Stream tokens into the page as they arrive, memoizing the full text.
+
+    On a memo hit the response is returned instantly with no network call and
+    nothing streamed. On a miss, tokens render progressively in a temporary
+    placeholder (so time-to-first-token, not total generation time, is what
+    the user waits for), which is cleared once the caller takes over rendering.
+
+    The preview renders as markdown by default. For the combined chain, whose
+    raw output is wire format (===CLEANED===/===EXPLANATION=== delimiters
+    around unfenced code), pass code_language: the preview then shows only the
+    cleaned-code section as a highlighted code block, suppressing the marker
+    lines and stopping at the explanation section. The full text is still
+    accumulated and returned for parsing.
+    """
+    memo = get_response_memo()
+    if key in memo:
+        return memo[key]
+    # Streaming bypasses LangChain's implicit LLM cache, so consult the
+    # persistent cache by hand before paying for a Gemini call.
+    llm_cache = get_llm_cache() if get_llm_cache else None
+    llm_string = f"{MODEL_NAME}@{MODEL_TEMPERATURE}"
+    if llm_cache:
+        hit = llm_cache.lookup(repr(key), llm_string)
+        if hit:
+            text = hit[0].text
+            memo[key] = text
+            return text
+    parts = []
+    placeholder = st.empty()
+    if code_language is None:
+        def _gen():
+            for chunk in chain.stream(inputs):
+                parts.append(chunk)
+                yield chunk
+
+        with placeholder.container():
+            st.write_stream(_gen())
     else:
-        uploaded_code = ""
+        done_showing = False
+        for chunk in chain.stream(inputs):
+            parts.append(chunk)
+            if done_showing:
+                continue
+            visible, marker, _ = "".join(parts).partition("===EXPLANATION===")
+            done_showing = bool(marker)
+            lines = visible.split("\n")
+            if not done_showing and lines and lines[-1].startswith("="):
+                # Hold back a possibly half-streamed delimiter line
+                lines = lines[:-1]
+            display = "\n".join(l for l in lines if not l.startswith("===CLEANED")).strip()
+            if display:
+                placeholder.code(display, language=code_language)
+    placeholder.empty()
+    # Trim once here so every consumer (memo hits included) sees clean text
+    text = "".join(parts).strip()
+    memo[key] = text
+    if llm_cache:
+        llm_cache.update(repr(key), llm_string, [Generation(text=text)])
+    while len(memo) > RESPONSE_MEMO_MAX:
+        memo.popitem(last=False)
+    return text
 
-# Always use the latest value from the text area (file upload fills it, but typing wins)
-def get_initial_code():
-    if uploaded_file and uploaded_code:
-        return uploaded_code
-    return st.session_state.text_input_value
+def _norm(code: str) -> str:
+    """Normalize line endings and trailing whitespace before caching/sending.
 
-# Initialize messy_code
-messy_code = ""
+    CRLF pastes, trailing spaces, and leading/trailing blank lines would
+    otherwise miss the response memo and the SQLite cache for what is the
+    same code, and they cost prompt tokens for nothing.
+    """
+    code = code.replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in code.split("\n")).strip()
 
-# Always show the text area
-messy_code = st.text_area(
-    " ",
-    value="" if st.session_state.clear_triggered else get_initial_code(),
-    height=300,
-    placeholder="Paste your messy or unformatted code here...",
-    help="Enter the code you want to optimize and document",
-    key="main_code_input",
-    on_change=lambda: setattr(st.session_state, 'text_input_value', st.session_state.main_code_input)
-)
+def run_explain(code: str, language: str) -> str:
+    _, explain_chain, _ = get_chains()
+    return stream_chain(explain_chain, {"code": code, "language": language}, ("explain", code, language))
+
+def run_optimize_and_explain(code: str, language: str) -> tuple:
+    _, _, combined_chain = get_chains()
+    text = stream_chain(
+        combined_chain,
+        {"code": code, "language": language},
+        ("optimize", code, language),
+        code_language=language,
+    )
+    cleaned, _, explanation = text.partition("===EXPLANATION===")
+    cleaned = cleaned.replace("===CLEANED===", "").strip()
+    return cleaned, explanation.strip()
+
+# Supported languages for highlighting
+LANGUAGES = [
+   "python", "javascript", "java", "c", "cpp", "csharp", "go", "ruby", "php", "rust", "typescript", "kotlin", "swift", "scala", "perl", "r", "bash", "html", "css", "sql", "json", "xml", "yaml", "markdown"
+]
+
+# Map Pygments names to LANGUAGES entries (case-insensitive, with aliases)
+PYGMENTS_TO_LANG = {
+    "python": "python",
+    "py": "python",
+    "python3": "python",
+    "javascript": "javascript",
+    "js": "javascript",
+    "java": "java",
+    "c": "c",
+    "c++": "cpp",
+    "cpp": "cpp",
+    "c#": "csharp",
+    "csharp": "csharp",
+    "c-sharp": "csharp",
+    "c# (c-sharp)": "csharp",
+    "go": "go",
+    "golang": "go",
+    "ruby": "ruby",
+    "rb": "ruby",
+    "php": "php",
+    "rust": "rust",
+    "typescript": "typescript",
+    "ts": "typescript",
+    "kotlin": "kotlin",
+    "swift": "swift",
+    "scala": "scala",
+    "perl": "perl",
+    "r": "r",
+    "bash": "bash",
+    "sh": "bash",
+    "shell": "bash",
+    "html": "html",
+    "xml+html": "html",
+    "css": "css",
+    "sql": "sql",
+    "json": "json",
+    "xml": "xml",
+    "yaml": "yaml",
+    "yml": "yaml",
+    "markdown": "markdown",
+    "md": "markdown",
+}
+_NON_ALNUM = re.compile(r"[^a-z0-9]")
+# Same table with punctuation stripped, so the fallback is a single dict lookup
+# instead of a per-key regex scan.
+SIMPLE_NAME_TO_LANG = {_NON_ALNUM.sub("", k): v for k, v in PYGMENTS_TO_LANG.items()}
 
-# --- Language Detection ---
-detected_language = None
 # Extension-based detection mapping
 EXTENSION_TO_LANG = {
     ".py": "python",
@@ -148,226 +299,96 @@ EXTENSION_TO_LANG = {
     ".yml": "yaml",
     ".md": "markdown",
 }
-# If uploaded_file is present, try to detect by extension first
-if uploaded_file and uploaded_file.name:
-    import os
-    _, ext = os.path.splitext(uploaded_file.name)
-    ext = ext.lower()
-    if ext in EXTENSION_TO_LANG:
-        detected_language = EXTENSION_TO_LANG[ext]
-# If not detected by extension, or no file uploaded, use Pygments
-if not detected_language and messy_code and guess_lexer:
-    try:
-        lexer = guess_lexer(messy_code)
-        pygments_name = lexer.name.lower()
-        # Map Pygments names to LANGUAGES entries (case-insensitive, with aliases)
-        pygments_to_lang = {
-            "python": "python",
-            "py": "python",
-            "python3": "python",
-            "javascript": "javascript",
-            "js": "javascript",
-            "java": "java",
-            "c": "c",
-            "c++": "cpp",
-            "cpp": "cpp",
-            "c#": "csharp",
-            "csharp": "csharp",
-            "c-sharp": "csharp",
-            "c# (c-sharp)": "csharp",
-            "go": "go",
-            "golang": "go",
-            "ruby": "ruby",
-            "rb": "ruby",
-            "php": "php",
-            "rust": "rust",
-            "typescript": "typescript",
-            "ts": "typescript",
-            "kotlin": "kotlin",
-            "swift": "swift",
-            "scala": "scala",
-            "perl": "perl",
-            "r": "r",
-            "bash": "bash",
-            "sh": "bash",
-            "shell": "bash",
-            "html": "html",
-            "xml+html": "html",
-            "css": "css",
-            "sql": "sql",
-            "json": "json",
-            "xml": "xml",
-            "yaml": "yaml",
-            "yml": "yaml",
-            "markdown": "markdown",
-            "md": "markdown",
-        }
-        # Try direct match, then lowercased, then stripped of special chars
-        detected_language = pygments_to_lang.get(pygments_name)
-        if not detected_language:
-            detected_language = pygments_to_lang.get(pygments_name.lower())
-        if not detected_language:
-            import re
-            simple_name = re.sub(r'[^a-z0-9]', '', pygments_name.lower())
-            for key, val in pygments_to_lang.items():
-                if re.sub(r'[^a-z0-9]', '', key.lower()) == simple_name:
-                    detected_language = val
-                    break
-        # Fallback: show raw lexer name if still not found
-        if not detected_language:
-            detected_language = pygments_name
-    except ClassNotFound:
-        detected_language = None
 
-# --- Prompt template for code cleaning and commenting ---
-prompt = PromptTemplate.from_template(
-    "You are a helpful code formatter and explainer. "
-    "Given the following messy or unordered {language} code, return a clean, well-formatted, and readable version with helpful comments explaining the code. "
-    "Do not add explanations outside the code, just return the cleaned and commented code.\n\n"
-    "Messy code:\n{code}\n\nCleaned and commented code:"
+# Cheap substring markers tried before guess_lexer; a substring test over the
+# first few hundred bytes is far cheaper than the full regex battery. Only
+# genuinely unambiguous needles belong here — anything a second language also
+# uses (e.g. "def ", shared by Python and Ruby) must fall through to
+# guess_lexer instead of hard-classifying the paste.
+SHEBANG_HINTS = (
+    ("#!/usr/bin/env python", "python"),
+    ("#!/usr/bin/python", "python"),
+    ("#!/usr/bin/env node", "javascript"),
+    ("#!/bin/bash", "bash"),
+    ("#!/usr/bin/env bash", "bash"),
+    ("#!/bin/sh", "bash"),
+    ("<?php", "php"),
+    ("package main", "go"),
+    ("public static void main", "java"),
 )
-chain = LLMChain(llm=llm, prompt=prompt)
 
-# --- Prompt template for code explanation ---
-explain_prompt = PromptTemplate.from_template(
-    "You are a helpful programming assistant. "
-    "Explain what the following {language} code does, step by step, in a visually structured way. "
-    "For each important code line or block, start with a callout (➤) and show the code using inline code formatting (single backticks). "
-    "Then, use bullet points to explain what that line or block does. "
-    "Highlight important terms or concepts in bold. "
-    "Use clear, readable markdown, and make the explanation easy to scan, like a professional code review or tutorial.\n\n"
-    "Code:\n{code}\n\nExplanation:"
-)
-explain_chain = LLMChain(llm=llm, prompt=explain_prompt)
-
-# --- Action Buttons ---
-st.markdown("### ⚡ Actions")
-col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
-with col1:
-    optimize_btn = st.button("🧹 Optimize Code", use_container_width=True)
-with col2:
-    explain_btn = st.button("📖 Explain Code", use_container_width=True)
-with col3:
-    revert_btn = st.button("↩️ Revert", use_container_width=True)
-with col4:
-    clear_btn = st.button("🗑️ Clear All", use_container_width=True)
-
-# Show warning immediately below actions if revert is pressed and nothing to revert
-if revert_btn and len(st.session_state.history) <= 1:
-    st.warning("⚠️ No previous version to revert to.")
-
-# Show success message immediately below actions if revert is successful
-if revert_btn and len(st.session_state.history) > 1:
-    st.session_state.history.pop()  # Remove current
-    prev = st.session_state.history[-1]
-    messy_code = prev["messy"]
-    optimized = prev["cleaned"]
-    detected_language = prev["language"]
-    st.success("✅ Reverted to previous version.")
-
-# Clear all data and reset to initial state
-if clear_btn:
-    # Clear session state
-    st.session_state.history = []
-    # Clear the text input value
-    st.session_state.text_input_value = ""
-    # Set clear flag
-    st.session_state.clear_triggered = True
-    # Rerun to refresh the page
-    st.rerun()
+# Language signals (shebang, keywords, brackets) live in the first few KB, so
+# only this much of the source is handed to guess_lexer. Keeps huge pastes
+# from being regex-scanned end to end and keeps the cache key small.
+GUESS_LEXER_PREFIX = 8192
 
-# Reset clear flag after widget creation
-if st.session_state.clear_triggered:
-    st.session_state.clear_triggered = False
-
-# --- Add flag to control comparison display ---
-if 'show_explanation_only' not in st.session_state:
-    st.session_state['show_explanation_only'] = False
+# Guessing the lexer is a regex-heavy pass over all Pygments lexers, so cache
+# the result per code text rather than re-guessing on every rerun.
+@st.cache_data(show_spinner=False, max_entries=32)
+def guess_lexer_name(code: str):
+    if not guess_lexer:
+        return None
+    try:
+        return guess_lexer(code).name.lower()
+    except ClassNotFound:
+        return None
 
-# --- Optimize Code ---
-if optimize_btn and messy_code.strip():
-    with st.spinner("🧹 Optimizing your code..."):
-        result = chain.invoke({"code": messy_code, "language": detected_language})
-        optimized = result["text"] if isinstance(result, dict) and "text" in result else result
-        # Save to history
-        st.session_state.history.append({
-            "messy": messy_code,
-            "cleaned": optimized,
-            "language": detected_language,
-        })
-    st.session_state['show_explanation_only'] = False  # Reset flag on optimize
+# Walking the lexer registry imports and instantiates every lexer plugin the
+# first time; warm it once per process instead of inside the first guess.
+@st.cache_resource
+def _warm_pygments():
+    return list(get_all_lexers())
 
-# --- Explain Code ---
-if explain_btn and messy_code.strip():
-    st.session_state['show_explanation_only'] = True
-    with st.spinner("📖 Analyzing your code..."):
-        explanation = explain_chain.invoke({"code": messy_code, "language": detected_language})
-        explanation_text = explanation["text"] if isinstance(explanation, dict) and "text" in explanation else explanation
-    st.markdown('<div class="comparison-section">', unsafe_allow_html=True)
-    st.markdown("### 📖 Code Explanation")
-    st.markdown(explanation_text)
-    st.markdown('</div>', unsafe_allow_html=True)
-    st.session_state['show_explanation_only'] = False  # Reset for next run
-    st.stop()
+if get_all_lexers:
+    _warm_pygments()
 
-# --- Show Side-by-Side Comparison ---
-if (
-    st.session_state.history
-    and st.session_state.history[-1]["cleaned"].strip()
-    and st.session_state.history[-1]["messy"].strip()
-    and not st.session_state.get('show_explanation_only', False)
-):
-    last = st.session_state.history[-1]
-    optimized = last["cleaned"]
-    messy = last["messy"]
-    detected_language = last["language"]
+def _lexer_name_to_lang(pygments_name):
+    # Try direct match, then stripped of special chars, then the raw name
+    return (
+        PYGMENTS_TO_LANG.get(pygments_name)
+        or SIMPLE_NAME_TO_LANG.get(_NON_ALNUM.sub("", pygments_name))
+        or pygments_name
+    )
 
-    st.markdown('<div class="comparison-section">', unsafe_allow_html=True)
-    st.markdown("### 📊 Code Comparison")
-    
-    c1, c2 = st.columns(2)
-    with c1:
-        st.markdown("**📝 Original Code**")
-        st.code(messy, language=detected_language)
-    with c2:
-        st.markdown("**✨ Optimized & Commented Code**")
-        st.code(optimized, language=detected_language)
-        # Add Explain Code button for optimized code
-        explain_optimized_btn = st.button("📖 Explain Optimized Code", key="explain_optimized_btn")
+# Detection is only called from the action handlers (not on every rerun of the
+# input widgets), and cached so typing or re-clicking with the same code never
+# repeats the work. Signals are tried cheapest first.
+@st.cache_data(show_spinner=False, max_entries=32)
+def detect_language(code: str, filename: str):
+    # Known file extension answers immediately
+    if filename:
+        _, ext = os.path.splitext(filename)
+        lang = EXTENSION_TO_LANG.get(ext.lower())
+        if lang:
+            return lang
+        # Pygments' filename path only pattern-matches lexer globs, which is
+        # far cheaper than the analyse_text scan over every lexer
+        if guess_lexer_for_filename:
+            try:
+                return _lexer_name_to_lang(guess_lexer_for_filename(filename, code[:4096]).name.lower())
+            except ClassNotFound:
+                pass
+    if not code:
+        return None
+    # Cheap substring markers next
+    head = code[:512]
+    # Markup tags are only unambiguous at the start of the document; anywhere
+    # else "<html" could sit inside a string literal of another language
+    if head.lstrip().lower().startswith(("<!doctype html", "<html")):
+        return "html"
+    for needle, lang in SHEBANG_HINTS:
+        if needle in head:
+            return lang
+    # Only if extension and substring hints both fail, use Pygments
+    pygments_name = guess_lexer_name(code[:GUESS_LEXER_PREFIX])
+    if pygments_name:
+        return _lexer_name_to_lang(pygments_name)
+    return None
 
-    # --- Download Optimized Code ---
-    st.markdown("### 💾 Download")
-    col1, col2 = st.columns([1, 3])
-    with col1:
-        st.download_button(
-            label="📥 Download Optimized Code",
-            data=optimized,
-            file_name=f"optimized_code.{detected_language}",
-            mime="text/plain",
-            use_container_width=True
-        )
-    with col2:
-        st.info("💡 Your optimized code is ready for download!")
-    st.markdown('</div>', unsafe_allow_html=True)
-
-    # --- Optimized Code Explanation (Full Width) ---
-    if 'explain_optimized_btn' in locals() and explain_optimized_btn:
-        with st.spinner("📖 Analyzing your optimized code..."):
-            explanation = explain_chain.invoke({"code": optimized, "language": detected_language})
-            explanation_text = explanation["text"] if isinstance(explanation, dict) and "text" in explanation else explanation
-        st.markdown("### 📖 Optimized Code Explanation")
-        st.markdown(explanation_text)
-
-# --- Footer ---
-st.markdown("""
-<div style="text-align: center; margin-top: 3rem; padding: 2rem; border-top: 1px solid #404040;">
-    <p style="color: #666; margin: 0;">🧹 Universal Code Optimizer - Powered by AI</p>
-    <p style="color: #666; margin: 0; font-size: 0.9rem;">Optimize, format, and document your code with ease</p>
-</div>
-""", unsafe_allow_html=True)
-
-# --- Dark Theme CSS (Only) ---
-dark_css = """
+# --- Static page chrome ---
+# The CSS, header, and features blocks never change, so keep them as module
+# constants and send them to the browser in a single st.markdown call.
+DARK_CSS = """
 <style>
 .stApp {
     background: linear-gradient(135deg, #1e1e1e 0%, #2d2d2d 100%);
@@ -517,4 +538,271 @@ section[data-testid="stFileUploader"] div[role="listitem"] {
 }
 </style>
 """
-st.markdown(dark_css, unsafe_allow_html=True)
+
+HEADER_HTML = """
+<div class="main-header">
+    <div style="display: flex; justify-content: space-between; align-items: center;">
+        <div>
+            <h1 style="color: white; margin: 0; font-size: 2.5rem; font-weight: 700;">🧹 Universal Code Optimizer</h1>
+            <p style="color: #e3f2fd; margin: 0; font-size: 1.2rem;">AI-Powered Code Optimization & Documentation</p>
+        </div>
+        <div style="text-align: right;">
+            <h3 style="color: white; margin: 0;">✨ Features</h3>
+            <p style="color: #e3f2fd; margin: 0; font-size: 0.9rem;">• Multi-language Support<br>• Smart Optimization<br>• Auto Documentation</p>
+        </div>
+    </div>
+</div>
+"""
+
+FEATURES_HTML = """
+<div class="feature-card">
+    <h2 style="color: #007acc; margin-bottom: 1rem;">🚀 What We Do</h2>
+    <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(250px, 1fr)); gap: 1rem;">
+        <div style="background: rgba(0, 122, 204, 0.1); padding: 1rem; border-radius: 8px; border-left: 4px solid #007acc;">
+            <h4 style="margin: 0 0 0.5rem 0;">🎯 Smart Optimization</h4>
+            <p style="margin: 0; font-size: 0.9rem;">Automatically optimize and structure your code for better readability</p>
+        </div>
+        <div style="background: rgba(0, 122, 204, 0.1); padding: 1rem; border-radius: 8px; border-left: 4px solid #007acc;">
+            <h4 style="margin: 0 0 0.5rem 0;">📝 Auto Documentation</h4>
+            <p style="margin: 0; font-size: 0.9rem;">Generate comprehensive comments and documentation</p>
+        </div>
+        <div style="background: rgba(0, 122, 204, 0.1); padding: 1rem; border-radius: 8px; border-left: 4px solid #007acc;">
+            <h4 style="margin: 0 0 0.5rem 0;">🔍 Multi-Language</h4>
+            <p style="margin: 0; font-size: 0.9rem;">Support for 20+ programming languages</p>
+        </div>
+    </div>
+</div>
+"""
+
+# --- Session State for Version History ---
+# Bounded deque of (messy, cleaned, language) tuples; caps memory when the
+# user iterates on large sources.
+HISTORY_LIMIT = 10
+if "history" not in st.session_state:
+    st.session_state.history = collections.deque(maxlen=HISTORY_LIMIT)
+
+# Add clear flag to session state
+if "clear_triggered" not in st.session_state:
+    st.session_state.clear_triggered = False
+
+# Add text input state
+if "text_input_value" not in st.session_state:
+    st.session_state.text_input_value = ""
+
+# Revision counter for the code box widget. Inside a form the typed text only
+# reaches session state on submit, so Clear bumps this to mint a fresh widget
+# key and discard text the frontend still holds but never submitted.
+if "input_rev" not in st.session_state:
+    st.session_state.input_rev = 0
+
+# --- Professional Header, Features & Dark Theme CSS ---
+st.markdown(DARK_CSS + HEADER_HTML + FEATURES_HTML, unsafe_allow_html=True)
+
+# --- Code Input Section ---
+col_head, col_upload = st.columns([6, 1], gap="small")
+with col_head:
+    st.markdown("""
+    <div style='margin-top:1.2rem; margin-bottom:0; display:flex; align-items:center;'>
+      <h2 style='color:#007acc; font-size:1.6rem; margin:0; display:inline; vertical-align:middle;'>Paste Your Code</h2>
+    </div>
+    """, unsafe_allow_html=True)
+with col_upload:
+    uploaded_file = st.file_uploader(" ", type=None, help="Upload any code file to get started", key="main_file_uploader")
+    if uploaded_file:
+        # Decode once per upload; reruns reuse the cached text instead of
+        # re-reading and re-decoding the whole file on every interaction.
+        if st.session_state.get("_uploaded_file_id") != uploaded_file.file_id:
+            st.session_state["_uploaded_code"] = uploaded_file.getvalue().decode("utf-8", "replace")
+            st.session_state["_uploaded_file_id"] = uploaded_file.file_id
+        uploaded_code = st.session_state["_uploaded_code"]
+    else:
+        uploaded_code = ""
+    uploaded_name = uploaded_file.name if uploaded_file else ""
+
+# Always use the latest value from the text area (file upload fills it, but typing wins)
+def get_initial_code():
+    if uploaded_file and uploaded_code:
+        return uploaded_code
+    return st.session_state.text_input_value
+
+# Initialize messy_code
+messy_code = ""
+
+# The text area and the LLM actions live in a form, so typing in the text area
+# no longer triggers a full script rerun per keystroke; one rerun happens per
+# submitted action. (Widgets inside a form may not use on_change, so the typed
+# text is synced to session state on submit below.)
+with st.form("code_form", clear_on_submit=False):
+    messy_code = st.text_area(
+        " ",
+        value="" if st.session_state.clear_triggered else get_initial_code(),
+        height=300,
+        placeholder="Paste your messy or unformatted code here...",
+        help="Enter the code you want to optimize and document",
+        key=f"main_code_input_{st.session_state.input_rev}",
+    )
+    st.markdown("### ⚡ Actions")
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        optimize_btn = st.form_submit_button("🧹 Optimize Code", use_container_width=True)
+    with col2:
+        explain_btn = st.form_submit_button("📖 Explain Code", use_container_width=True)
+
+if optimize_btn or explain_btn:
+    st.session_state.text_input_value = messy_code
+
+# --- Language Detection ---
+# Deferred to the action handlers via detect_language(); running it here would
+# re-scan the code on every keystroke of the text area.
+detected_language = None
+
+# --- History Buttons ---
+# Revert and Clear act immediately, so they stay outside the form
+col3, col4 = st.columns([1, 1])
+with col3:
+    revert_btn = st.button("↩️ Revert", use_container_width=True)
+with col4:
+    clear_btn = st.button("🗑️ Clear All", use_container_width=True)
+
+# Show warning immediately below actions if revert is pressed and nothing to revert
+if revert_btn and len(st.session_state.history) <= 1:
+    st.warning("⚠️ No previous version to revert to.")
+
+# Show success message immediately below actions if revert is successful
+if revert_btn and len(st.session_state.history) > 1:
+    st.session_state.history.pop()  # Remove current
+    messy_code, optimized, detected_language = st.session_state.history[-1]
+    st.success("✅ Reverted to previous version.")
+
+# Clear all data and reset to initial state
+if clear_btn:
+    # Clear session state
+    st.session_state.history = collections.deque(maxlen=HISTORY_LIMIT)
+    # Clear the text input value
+    st.session_state.text_input_value = ""
+    # New widget key, so the rerun drops any typed-but-unsubmitted text too
+    st.session_state.input_rev += 1
+    # Set clear flag
+    st.session_state.clear_triggered = True
+    # Rerun to refresh the page
+    st.rerun()
+
+# Reset clear flag after widget creation
+if st.session_state.clear_triggered:
+    st.session_state.clear_triggered = False
+
+# --- Add flag to control comparison display ---
+if 'show_explanation_only' not in st.session_state:
+    st.session_state['show_explanation_only'] = False
+
+# --- Optimize Code ---
+if optimize_btn and messy_code.strip():
+    norm_code = _norm(messy_code)
+    detected_language = detect_language(norm_code[:GUESS_LEXER_PREFIX], uploaded_name)
+    with st.spinner("🧹 Optimizing your code..."):
+        optimized, explanation = run_optimize_and_explain(norm_code, detected_language)
+        # Keep the explanation around so "Explain Optimized Code" is instant.
+        st.session_state["optimized_explanation"] = (optimized, explanation)
+        if not explanation:
+            # The combined call came back without an explanation section, so
+            # kick the explain call off now in the background; it is usually
+            # already finished by the time the user clicks the button.
+            _, explain_chain, _ = get_chains()
+            future = asyncio.run_coroutine_threadsafe(
+                explain_chain.ainvoke({"code": optimized, "language": detected_language}),
+                get_background_loop(),
+            )
+            st.session_state["pending_explain"] = (optimized, future)
+        # Save to history
+        st.session_state.history.append((norm_code, optimized, detected_language))
+    st.session_state['show_explanation_only'] = False  # Reset flag on optimize
+
+# --- Explain Code ---
+if explain_btn and messy_code.strip():
+    norm_code = _norm(messy_code)
+    detected_language = detect_language(norm_code[:GUESS_LEXER_PREFIX], uploaded_name)
+    st.session_state['show_explanation_only'] = True
+    with st.spinner("📖 Analyzing your code..."):
+        explanation_text = run_explain(norm_code, detected_language)
+    st.markdown('<div class="comparison-section">', unsafe_allow_html=True)
+    st.markdown("### 📖 Code Explanation")
+    st.markdown(explanation_text)
+    st.markdown('</div>', unsafe_allow_html=True)
+    st.session_state['show_explanation_only'] = False  # Reset for next run
+    st.stop()
+
+# Client-side syntax highlighting is the dominant rendering cost for big
+# sources and would re-run on every rerun, so previews are capped and the
+# full text shown only on demand.
+CODE_PREVIEW_LINES = 400
+
+def show_code(code, language, key):
+    lines = code.splitlines()
+    if len(lines) > CODE_PREVIEW_LINES and not st.checkbox(f"Show all {len(lines)} lines", key=key):
+        code = "\n".join(lines[:CODE_PREVIEW_LINES]) + "\n..."
+    st.code(code, language=language)
+
+# --- Show Side-by-Side Comparison ---
+if (
+    st.session_state.history
+    and st.session_state.history[-1][1]
+    and st.session_state.history[-1][0]
+    and not st.session_state.get('show_explanation_only', False)
+):
+    messy, optimized, detected_language = st.session_state.history[-1]
+
+    st.markdown('<div class="comparison-section">', unsafe_allow_html=True)
+    st.markdown("### 📊 Code Comparison")
+    
+    c1, c2 = st.columns(2)
+    with c1:
+        st.markdown("**📝 Original Code**")
+        show_code(messy, detected_language, "show_all_messy")
+    with c2:
+        st.markdown("**✨ Optimized & Commented Code**")
+        show_code(optimized, detected_language, "show_all_optimized")
+        # Add Explain Code button for optimized code
+        explain_optimized_btn = st.button("📖 Explain Optimized Code", key="explain_optimized_btn")
+
+    # --- Download Optimized Code ---
+    st.markdown("### 💾 Download")
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        st.download_button(
+            label="📥 Download Optimized Code",
+            data=optimized,
+            file_name=f"optimized_code.{detected_language}",
+            mime="text/plain",
+            use_container_width=True
+        )
+    with col2:
+        st.info("💡 Your optimized code is ready for download!")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    # --- Optimized Code Explanation (Full Width) ---
+    if 'explain_optimized_btn' in locals() and explain_optimized_btn:
+        with st.spinner("📖 Analyzing your optimized code..."):
+            cached = st.session_state.get("optimized_explanation")
+            pending = st.session_state.pop("pending_explain", None)
+            if cached and cached[0] == optimized and cached[1]:
+                explanation_text = cached[1]
+            elif pending and pending[0] == optimized:
+                # Trim like stream_chain would and file the result under the
+                # key run_explain uses, so later identical explains hit it
+                explanation_text = pending[1].result().strip()
+                memo = get_response_memo()
+                memo[("explain", optimized, detected_language)] = explanation_text
+                while len(memo) > RESPONSE_MEMO_MAX:
+                    memo.popitem(last=False)
+            else:
+                explanation_text = run_explain(optimized, detected_language)
+        st.markdown("### 📖 Optimized Code Explanation")
+        st.markdown(explanation_text)
+
+# --- Footer ---
+st.markdown("""
+<div style="text-align: center; margin-top: 3rem; padding: 2rem; border-top: 1px solid #404040;">
+    <p style="color: #666; margin: 0;">🧹 Universal Code Optimizer - Powered by AI</p>
+    <p style="color: #666; margin: 0; font-size: 0.9rem;">Optimize, format, and document your code with ease</p>
+</div>
+""", unsafe_allow_html=True)